@@ -1,7 +1,14 @@
 import os
+import re
 import json
 import io
+import hashlib
+import random
+import threading
 import arxiv
+import numpy as np
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
 from gtts import gTTS
 
@@ -17,7 +24,25 @@ load_dotenv()
 embeddings = None
 client = None 
 
+QUIZ_BANK_FILE = "quiz_bank.json"
+CHUNKS_FILE = "chunks.json"
+ANSWER_CACHE_FILE = "answer_cache.json"
+# Cosine similarity above which a new question reuses a cached answer.
+# Kept high on purpose: ada-002 scores ~0.9 for same-topic questions with different
+# answers ("what is a stack" vs "what is a queue").
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.97"))
+# Oldest answers are evicted past this, so each rewrite of the cache file stays bounded
+ANSWER_CACHE_MAX_ENTRIES = max(1, int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "500")))
+
+_file_lock = threading.Lock()
+_answer_caches = {}
+_quiz_bank_builds = {}
+_mind_map_builds = {}
+
 # --- INITIALIZATION ---
+def _doc_fingerprint(chunks):
+    return hashlib.sha1("\n".join(chunks).encode("utf-8")).hexdigest()
+
 def get_llm(model_name="gpt-3.5-turbo"):
     """
     Returns the LLM based on user selection.
@@ -72,21 +97,167 @@ def generate_deep_summary(chunks, model_name="gpt-3.5-turbo"):
         except Exception as e2:
             return f"❌ Connection Error: {str(e2)}"
 
-def generate_mind_map(text_chunk, model_name="gpt-3.5-turbo"):
+MIND_MAP_FILE = "mind_map.json"
+
+def extract_concepts(text_chunk, model_name="gpt-3.5-turbo"):
+    """
+    Pulls a small concept graph out of ONE chunk.
+    Edges point from the broader concept to the narrower one (parent -> child).
+    """
     llm = get_llm(model_name)
     if not llm: return {"nodes": [], "edges": []}
     try:
         prompt = f"""
-        Analyze the text and identify core concepts.
-        Output ONLY valid JSON with 'nodes' (id) and 'edges' (from, to).
+        Analyze the text and identify core concepts and how they nest.
+        Output ONLY valid JSON with 'nodes' (id) and 'edges' (from, to),
+        where each edge goes from the broader concept to the narrower one.
         TEXT: {text_chunk[:3000]}
         """
         response = llm.invoke(prompt)
         content = response.content.replace("```json", "").replace("```", "").strip()
-        return json.loads(content)
+        graph = json.loads(content)
+        # One malformed chunk must not abort the whole document merge
+        if not isinstance(graph, dict) or not isinstance(graph.get("nodes", []), list) or not isinstance(graph.get("edges", []), list):
+            return {"nodes": [], "edges": []}
+        return graph
     except:
         return {"nodes": [], "edges": []}
 
+def normalize_concept(name):
+    """
+    Canonical key for a concept so 'Neural Networks', 'neural networks' and
+    ' Neural-Networks. ' all collapse into one node.
+    Only case, whitespace and separator punctuation ('-', '_', trailing '.' or ',')
+    are folded. Plurals and symbols are left alone because they tell concepts
+    apart ('News' / 'New', 'C++' / 'C#' / 'C', '.NET' / 'net').
+    """
+    key = str(name).lower().strip().rstrip(".,")
+    return " ".join(re.sub(r"[-_]", " ", key).split())
+
+def merge_mind_maps(graph, partial):
+    """
+    Folds one chunk graph into the running document graph (in place).
+    Nodes are deduplicated by normalized name and keep the first label seen;
+    'weight' counts how many chunks mentioned the concept.
+    """
+    if not isinstance(partial, dict): return graph
+    index = {node["id"]: node for node in graph["nodes"]}
+    seen_edges = {(edge["from"], edge["to"]) for edge in graph["edges"]}
+    labels = {}
+    chunk_keys = set()
+
+    for node in partial.get("nodes", []):
+        label = node.get("id") if isinstance(node, dict) else node
+        if not label: continue
+        key = normalize_concept(label)
+        if not key: continue
+        labels[str(label)] = key
+        if key in chunk_keys: continue
+        chunk_keys.add(key)
+        if key in index:
+            index[key]["weight"] += 1
+        else:
+            index[key] = {"id": key, "label": str(label).strip(), "weight": 1}
+            graph["nodes"].append(index[key])
+
+    for edge in partial.get("edges", []):
+        if not isinstance(edge, dict): continue
+        src = labels.get(str(edge.get("from")), normalize_concept(edge.get("from", "")))
+        dst = labels.get(str(edge.get("to")), normalize_concept(edge.get("to", "")))
+        if src in index and dst in index and src != dst and (src, dst) not in seen_edges:
+            graph["edges"].append({"from": src, "to": dst})
+            seen_edges.add((src, dst))
+    return graph
+
+def save_mind_map(graph, save_path):
+    if not save_path: return
+    tmp_file = os.path.join(save_path, MIND_MAP_FILE + ".tmp")
+    with open(tmp_file, "w") as f:
+        json.dump(graph, f)
+    os.replace(tmp_file, os.path.join(save_path, MIND_MAP_FILE))
+
+def load_mind_map(load_path):
+    mm_file = os.path.join(load_path, MIND_MAP_FILE)
+    if os.path.exists(mm_file):
+        try:
+            with open(mm_file, "r") as f:
+                return json.load(f)
+        except: return None
+    return None
+
+def generate_mind_map(chunks, model_name="gpt-3.5-turbo", save_path=None, max_workers=4, doc_id=None):
+    """
+    Builds a mind map of the WHOLE document.
+    Every chunk is sent for concept extraction in parallel, the partial graphs are
+    merged as they come back, and the merged graph (with 'chunks_done' progress)
+    is written to the unit folder after each chunk so the UI can show it early.
+    Stops early if a build for a different document replaced this one.
+    """
+    if isinstance(chunks, str): chunks = [chunks]
+    graph = {"nodes": [], "edges": [], "doc_id": doc_id, "chunks_done": 0, "chunk_count": len(chunks), "complete": False}
+    if not chunks or not get_llm(model_name): return graph
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = [pool.submit(extract_concepts, chunk, model_name) for chunk in chunks]
+        for future in as_completed(futures):
+            merge_mind_maps(graph, future.result())
+            graph["chunks_done"] += 1
+            graph["complete"] = graph["chunks_done"] == len(chunks)
+            with _file_lock:
+                if doc_id and save_path and _mind_map_builds.get(save_path, (doc_id,))[0] != doc_id:
+                    for pending in futures: pending.cancel()
+                    return graph
+                save_mind_map(graph, save_path)
+    return graph
+
+def start_mind_map(chunks, save_path, model_name="gpt-3.5-turbo"):
+    """
+    Runs generate_mind_map in a background thread so uploads don't wait on it.
+    Skipped if this document's map is already built or being built.
+    """
+    if not chunks or not save_path or not get_llm(model_name): return None
+    doc_id = _doc_fingerprint(chunks)
+
+    with _file_lock:
+        running = _mind_map_builds.get(save_path)
+        if running and running[0] == doc_id and running[1].is_alive(): return running[1]
+        data = load_mind_map(save_path) or {}
+        if data.get("doc_id") == doc_id and data.get("complete"): return None
+        save_mind_map({"nodes": [], "edges": [], "doc_id": doc_id, "chunks_done": 0, "chunk_count": len(chunks), "complete": False}, save_path)
+        worker = threading.Thread(target=generate_mind_map, args=(chunks, model_name, save_path), kwargs={"doc_id": doc_id}, daemon=True)
+        _mind_map_builds[save_path] = (doc_id, worker)
+        worker.start()
+    return worker
+
+def rank_mind_map_nodes(graph):
+    """
+    Orders node ids by importance: degree first, then how many chunks mentioned it.
+    """
+    degree = Counter()
+    for edge in graph.get("edges", []):
+        degree[edge["from"]] += 1
+        degree[edge["to"]] += 1
+    nodes = graph.get("nodes", [])
+    ranked = sorted(nodes, key=lambda n: (degree[n["id"]], n.get("weight", 1)), reverse=True)
+    return [node["id"] for node in ranked]
+
+def downsample_mind_map(graph, max_nodes=60, expanded=None):
+    """
+    Keeps the browser responsive on big graphs.
+    Returns the top 'max_nodes' concepts plus the direct neighbours of every
+    node in 'expanded', with only the edges between visible nodes.
+    """
+    visible = set(rank_mind_map_nodes(graph)[:max_nodes])
+    for node_id in expanded or []:
+        visible.add(node_id)
+        for edge in graph.get("edges", []):
+            if edge["from"] == node_id: visible.add(edge["to"])
+            elif edge["to"] == node_id: visible.add(edge["from"])
+
+    nodes = [node for node in graph.get("nodes", []) if node["id"] in visible]
+    edges = [edge for edge in graph.get("edges", []) if edge["from"] in visible and edge["to"] in visible]
+    return {"nodes": nodes, "edges": edges}
+
 def generate_quiz(text_chunk, model_name="gpt-3.5-turbo"):
     llm = get_llm(model_name)
     if not llm: return []
@@ -108,6 +279,121 @@ def generate_quiz(text_chunk, model_name="gpt-3.5-turbo"):
     except:
         return []
 
+def _read_quiz_bank(load_path):
+    """
+    Bank file is {"doc_id", "complete", "questions"}; doc_id fingerprints the
+    document the questions came from.
+    """
+    bank_file = os.path.join(load_path, QUIZ_BANK_FILE)
+    if os.path.exists(bank_file):
+        try:
+            with open(bank_file, "r") as f:
+                data = json.load(f)
+            if isinstance(data, dict): return data
+        except: pass
+    return {"doc_id": None, "complete": False, "questions": []}
+
+def _write_quiz_bank(save_path, data):
+    tmp_file = os.path.join(save_path, QUIZ_BANK_FILE + ".tmp")
+    with open(tmp_file, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_file, os.path.join(save_path, QUIZ_BANK_FILE))
+
+def save_chunks(save_path, chunks):
+    """
+    Keeps the last analyzed document's chunks in the unit folder so background
+    builds interrupted by a restart can resume when the unit is reopened.
+    """
+    tmp_file = os.path.join(save_path, CHUNKS_FILE + ".tmp")
+    with open(tmp_file, "w") as f:
+        json.dump(chunks, f)
+    os.replace(tmp_file, os.path.join(save_path, CHUNKS_FILE))
+
+def load_chunks(load_path):
+    chunks_file = os.path.join(load_path, CHUNKS_FILE)
+    if os.path.exists(chunks_file):
+        try:
+            with open(chunks_file, "r") as f:
+                return json.load(f)
+        except: return []
+    return []
+
+def load_quiz_bank(load_path):
+    return _read_quiz_bank(load_path).get("questions", [])
+
+def _is_valid_question(q):
+    return (
+        isinstance(q, dict)
+        and isinstance(q.get("question"), str) and q["question"].strip()
+        and isinstance(q.get("answer"), str) and q["answer"].strip()
+        and isinstance(q.get("options"), list) and len(q["options"]) >= 2
+        and all(isinstance(option, str) for option in q["options"])
+    )
+
+def build_quiz_bank(chunks, save_path, doc_id, model_name="gpt-3.5-turbo", max_workers=4):
+    """
+    Fills the unit's question bank with questions from EVERY chunk.
+    Each result is merged into the bank on disk (skipping duplicates) under the
+    lock, so quizzes can be served while the rest is still being built.
+    Stops early if the bank was reset for a different document meanwhile.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = [pool.submit(generate_quiz, chunk, model_name) for chunk in chunks]
+        for future in as_completed(futures):
+            questions = future.result()
+            with _file_lock:
+                data = _read_quiz_bank(save_path)
+                if data.get("doc_id") != doc_id:
+                    for pending in futures: pending.cancel()
+                    return
+                if not isinstance(questions, list): continue
+                seen = {q.get("question") for q in data["questions"]}
+                for q in questions:
+                    if _is_valid_question(q) and q["question"] not in seen:
+                        data["questions"].append(q)
+                        seen.add(q["question"])
+                _write_quiz_bank(save_path, data)
+
+    with _file_lock:
+        data = _read_quiz_bank(save_path)
+        if data.get("doc_id") == doc_id:
+            data["complete"] = True
+            _write_quiz_bank(save_path, data)
+
+def start_quiz_bank(chunks, save_path, model_name="gpt-3.5-turbo"):
+    """
+    Runs build_quiz_bank in a background thread so uploads don't wait on it.
+    Skipped if this document's bank is already built or being built; a
+    different document resets the bank first.
+    """
+    if not chunks or not save_path or not get_llm(model_name): return None
+    doc_id = _doc_fingerprint(chunks)
+
+    with _file_lock:
+        running = _quiz_bank_builds.get(save_path)
+        if running and running[0] == doc_id and running[1].is_alive(): return running[1]
+        data = _read_quiz_bank(save_path)
+        if data.get("doc_id") == doc_id and data.get("complete"): return None
+        if data.get("doc_id") != doc_id:
+            _write_quiz_bank(save_path, {"doc_id": doc_id, "complete": False, "questions": []})
+        worker = threading.Thread(target=build_quiz_bank, args=(chunks, save_path, doc_id, model_name), daemon=True)
+        _quiz_bank_builds[save_path] = (doc_id, worker)
+        worker.start()
+    return worker
+
+def is_quiz_bank_building(load_path):
+    with _file_lock:
+        data = _read_quiz_bank(load_path)
+    return bool(data.get("doc_id")) and not data.get("complete")
+
+def get_quiz_from_bank(load_path, n=3):
+    """
+    Serves a random quiz instantly from the pre-generated bank (no LLM call).
+    """
+    with _file_lock:
+        bank = load_quiz_bank(load_path)
+    return random.sample(bank, min(n, len(bank)))
+
 # --- 2. RESEARCH ENGINE (ARXIV) ---
 
 def search_arxiv_papers(topic):
@@ -145,6 +431,9 @@ def create_vector_db(chunks, save_path=None):
         if save_path:
             vs_path = os.path.join(save_path, "vector_store")
             vector_store.save_local(vs_path)
+            # New document, new knowledge: old cached answers no longer apply
+            _answer_caches[save_path] = []
+            save_answer_cache(save_path, [])
         return vector_store
     except Exception as e:
         print(f"DB Error: {e}")
@@ -159,17 +448,111 @@ def load_vector_db(load_path):
         except: return None
     return None
 
-def get_chat_response(query, vector_store, model_name="gpt-3.5-turbo"):
+def load_answer_cache(load_path):
+    """
+    Answer cache entries are {"question", "answer", "model", "embedding"}.
+    Kept in memory per unit after the first read.
+    """
+    cache_file = os.path.join(load_path, ANSWER_CACHE_FILE)
+    if not os.path.exists(cache_file): _answer_caches.pop(load_path, None)
+    if load_path in _answer_caches: return _answer_caches[load_path]
+    cache = []
+    if os.path.exists(cache_file):
+        try:
+            with open(cache_file, "r") as f:
+                cache = json.load(f)
+        except: cache = []
+    _answer_caches[load_path] = cache
+    return cache
+
+def save_answer_cache(save_path, cache):
+    with _file_lock:
+        if len(cache) > ANSWER_CACHE_MAX_ENTRIES:
+            del cache[:len(cache) - ANSWER_CACHE_MAX_ENTRIES]
+        tmp_file = os.path.join(save_path, ANSWER_CACHE_FILE + ".tmp")
+        with open(tmp_file, "w") as f:
+            json.dump(cache, f)
+        os.replace(tmp_file, os.path.join(save_path, ANSWER_CACHE_FILE))
+
+def find_cached_answer(query_embedding, cache, model_name, threshold=ANSWER_CACHE_THRESHOLD):
+    cache = [entry for entry in cache if entry.get("model") == model_name]
+    if not cache: return None
+    matrix = np.array([entry["embedding"] for entry in cache])
+    query_vec = np.array(query_embedding)
+    scores = matrix @ query_vec / (np.linalg.norm(matrix, axis=1) * np.linalg.norm(query_vec) + 1e-10)
+    best = int(np.argmax(scores))
+    return cache[best]["answer"] if scores[best] >= threshold else None
+
+NON_ANSWER_PHRASES = (
+    "i don't know", "i do not know", "i'm not sure", "i am not sure",
+    "cannot answer", "can't answer", "unable to answer", "no information",
+    "not mentioned", "does not provide", "doesn't provide", "not provided in the",
+)
+
+def is_cacheable_answer(answer):
+    """
+    Errors, empty replies and "I don't know" style refusals are never cached,
+    otherwise they'd be served for every similar question until the next upload.
+    """
+    if not answer or not answer.strip(): return False
+    if answer == "AI not ready." or answer.startswith("Error:"): return False
+    lowered = answer.lower()
+    return not any(phrase in lowered for phrase in NON_ANSWER_PHRASES)
+
+def seed_answer_cache(project_path, history, model_name="gpt-3.5-turbo"):
+    """
+    One-time import of question/answer pairs from chat_history.json for units
+    that have no answer cache yet, embedding them in one batch call.
+    Answers saved without a "model" field are attributed to 'model_name'.
+    """
+    if not embeddings or os.path.exists(os.path.join(project_path, ANSWER_CACHE_FILE)): return
+    cache = load_answer_cache(project_path)
+    cached = {entry["question"] for entry in cache}
+    pairs = []
+    for prev, curr in zip(history, history[1:]):
+        if prev["role"] == "user" and curr["role"] == "assistant" and prev["content"] not in cached:
+            if not is_cacheable_answer(curr["content"]): continue
+            pairs.append((prev["content"], curr["content"], curr.get("model", model_name)))
+            cached.add(prev["content"])
+    if not pairs: return
+    try:
+        vectors = embeddings.embed_documents([question for question, _, _ in pairs])
+        for (question, answer, model), vector in zip(pairs, vectors):
+            cache.append({"question": question, "answer": answer, "model": model, "embedding": vector})
+        save_answer_cache(project_path, cache)
+    except Exception as e:
+        print(f"Cache Seed Error: {e}")
+
+def get_chat_response(query, vector_store, model_name="gpt-3.5-turbo", cache_path=None, threshold=ANSWER_CACHE_THRESHOLD):
+    """
+    Answers from the unit's documents. Returns (answer, from_cache).
+    With 'cache_path', questions similar enough to one already answered by the
+    same model (cosine >= threshold) return the cached answer and skip retrieval and the LLM.
+    """
     llm = get_llm(model_name)
-    if not llm or not vector_store: return "AI not ready."
+    if not llm or not vector_store: return "AI not ready.", False
+
+    query_embedding = None
+    if cache_path and embeddings:
+        try:
+            query_embedding = embeddings.embed_query(query)
+            cached_answer = find_cached_answer(query_embedding, load_answer_cache(cache_path), model_name, threshold)
+            if cached_answer: return cached_answer, True
+        except Exception as e:
+            print(f"Cache Lookup Error: {e}")
+
     try:
         qa_chain = RetrievalQA.from_chain_type(
             llm=llm, chain_type="stuff", retriever=vector_store.as_retriever()
         )
         response = qa_chain.invoke(query)
-        return response["result"]
+        if query_embedding is not None and is_cacheable_answer(response["result"]):
+            cache = load_answer_cache(cache_path)
+            cache.append({"question": query, "answer": response["result"], "model": model_name, "embedding": query_embedding})
+            save_answer_cache(cache_path, cache)
+        return response["result"], False
     except Exception as e:
-        return f"Error: {str(e)}"
+        return f"Error: {str(e)}", False
 
 # --- 4. AUDIO ---
 def transcribe_audio(audio_file):
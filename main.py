@@ -11,8 +11,11 @@ from project_manager import load_projects, create_project, update_project_notes,
 from pdf_processor import process_document
 from video_processor import process_video
 from ai_engine import (
-    generate_deep_summary, generate_mind_map, create_vector_db, load_vector_db,
-    get_chat_response, generate_quiz, search_arxiv_papers,
+    generate_deep_summary, start_mind_map, load_mind_map, downsample_mind_map,
+    create_vector_db, load_vector_db,
+    get_chat_response, seed_answer_cache, generate_quiz, start_quiz_bank, get_quiz_from_bank,
+    is_quiz_bank_building, save_chunks, load_chunks,
+    search_arxiv_papers,
     transcribe_audio, text_to_speech
 )
 
@@ -59,6 +62,8 @@ if "vector_store" not in st.session_state: st.session_state.vector_store = None
 if "chat_history" not in st.session_state: st.session_state.chat_history = []
 if "last_summary" not in st.session_state: st.session_state.last_summary = None
 if "last_mm" not in st.session_state: st.session_state.last_mm = None
+if "mm_expanded" not in st.session_state: st.session_state.mm_expanded = []
+if "mm_last_click" not in st.session_state: st.session_state.mm_last_click = None
 if "last_quiz" not in st.session_state: st.session_state.last_quiz = None
 if "theme" not in st.session_state: st.session_state.theme = "☀️ Light Mode"
 if "model_choice" not in st.session_state: st.session_state.model_choice = "gpt-3.5-turbo"
@@ -100,6 +105,14 @@ with st.sidebar:
                 project_path = projects[selected_unit_option]['path']
                 st.session_state.vector_store = load_vector_db(project_path)
                 st.session_state.chat_history = load_chat_history(project_path)
+                seed_answer_cache(project_path, st.session_state.chat_history, st.session_state.model_choice)
+                # Resume background builds a server restart may have cut short (no-op once complete)
+                unit_chunks = load_chunks(project_path)
+                start_quiz_bank(unit_chunks, project_path, st.session_state.model_choice)
+                start_mind_map(unit_chunks, project_path, st.session_state.model_choice)
+                st.session_state.last_mm = load_mind_map(project_path)
+                st.session_state.mm_expanded = []
+                st.session_state.mm_last_click = None
                 st.toast(f"Unit Loaded: {selected_unit_option}")
                 st.rerun()
 
@@ -113,6 +126,8 @@ with st.sidebar:
                     st.session_state.chat_history = []
                     st.session_state.last_summary = None
                     st.session_state.last_mm = None
+                    st.session_state.mm_expanded = []
+                    st.session_state.mm_last_click = None
                     st.session_state.last_quiz = None
                     st.success(f"Deleted {selected_unit_option}")
                     st.rerun()
@@ -189,11 +204,15 @@ if st.session_state.current_project and st.session_state.current_project in proj
 
         if doc_data:
             summary = generate_deep_summary(doc_data['chunks'], st.session_state.model_choice)
-            mm_data = generate_mind_map(doc_data['chunks'][0], st.session_state.model_choice)
+            save_chunks(project_data['path'], doc_data['chunks'])
+            start_mind_map(doc_data['chunks'], project_data['path'], st.session_state.model_choice)
             vector_store = create_vector_db(doc_data['chunks'], save_path=project_data['path'])
+            start_quiz_bank(doc_data['chunks'], project_data['path'], st.session_state.model_choice)
             st.session_state.vector_store = vector_store
             st.session_state.last_summary = summary
-            st.session_state.last_mm = mm_data
+            st.session_state.last_mm = None
+            st.session_state.mm_expanded = []
+            st.session_state.mm_last_click = None
             st.success("✅ Memory Updated.")
 
     with tab_images:
@@ -223,19 +242,45 @@ if st.session_state.current_project and st.session_state.current_project in proj
 
     with tab_map:
         st.subheader("🗺️ Knowledge Graph")
+        # The map is built in the background; keep picking up the partial graph from disk until it finishes
+        if not st.session_state.last_mm or not st.session_state.last_mm.get("complete", True):
+            st.session_state.last_mm = load_mind_map(project_data['path'])
+        mm_building = st.session_state.last_mm and not st.session_state.last_mm.get("complete", True)
+        if mm_building:
+            st.info(f"⏳ Building mind map... {st.session_state.last_mm.get('chunks_done', 0)}/{st.session_state.last_mm.get('chunk_count', 0)} chunks processed.")
+            # UNIQUE KEY 28: btn_mm_refresh
+            if st.button("🔄 Refresh Map", key="btn_mm_refresh"): st.rerun()
         if st.session_state.last_mm:
             from streamlit_agraph import agraph, Node, Edge, Config
-            nodes, edges, seen_ids = [], [], set()
-            for node in st.session_state.last_mm.get("nodes", []):
-                if node["id"] not in seen_ids:
-                    nodes.append(Node(id=node["id"], label=node["id"], size=25, shape="dot", color="#FF4B4B"))
-                    seen_ids.add(node["id"])
-            for edge in st.session_state.last_mm.get("edges", []):
-                if edge["from"] in seen_ids and edge["to"] in seen_ids:
-                    edges.append(Edge(source=edge["from"], target=edge["to"], color="#E0E0E0"))
-            config = Config(width=None, height=600, directed=True, physics=True, hierarchical=False)
-            if nodes: agraph(nodes=nodes, edges=edges, config=config)
-            else: st.warning("Mind map empty.")
+            full_mm = st.session_state.last_mm
+            total_nodes = len(full_mm.get("nodes", []))
+            # UNIQUE KEY 26: mm_max_nodes_slider
+            max_nodes = total_nodes
+            if total_nodes > 10:
+                max_nodes = st.slider("Concepts shown", 10, min(total_nodes, 300), min(total_nodes, 60), key="mm_max_nodes_slider")
+            view = downsample_mind_map(full_mm, max_nodes, st.session_state.mm_expanded)
+            st.caption(f"Showing {len(view['nodes'])} of {total_nodes} concepts. Click a node to expand its neighbours.")
+
+            nodes = [Node(id=node["id"], label=node.get("label", node["id"]), size=15 + 3 * min(node.get("weight", 1), 5), shape="dot", color="#FF4B4B") for node in view["nodes"]]
+            edges = [Edge(source=edge["from"], target=edge["to"], color="#E0E0E0") for edge in view["edges"]]
+            # Physics layout is what freezes the browser on big graphs, so large views use the
+            # static hierarchical layout instead (edges already point parent -> child)
+            use_physics = len(nodes) <= 100
+            config = Config(width=None, height=600, directed=True, physics=use_physics, hierarchical=not use_physics)
+            if nodes:
+                clicked = agraph(nodes=nodes, edges=edges, config=config)
+                # agraph keeps returning the last clicked node, so only react to a new click
+                if clicked and clicked != st.session_state.mm_last_click:
+                    st.session_state.mm_last_click = clicked
+                    if clicked not in st.session_state.mm_expanded:
+                        st.session_state.mm_expanded.append(clicked)
+                        st.rerun()
+                # UNIQUE KEY 27: btn_mm_collapse
+                if st.session_state.mm_expanded and st.button("↩️ Collapse Expanded Nodes", key="btn_mm_collapse"):
+                    st.session_state.mm_expanded = []
+                    st.session_state.mm_last_click = None
+                    st.rerun()
+            elif not mm_building: st.warning("Mind map empty.")
         else: st.info("Analyze a document first.")
 
     with tab_chat:
@@ -250,22 +295,30 @@ if st.session_state.current_project and st.session_state.current_project in proj
         if user_query and st.session_state.vector_store:
             st.session_state.chat_history.append({"role": "user", "content": user_query})
             with st.spinner("Thinking..."):
-                ai_response = get_chat_response(user_query, st.session_state.vector_store, st.session_state.model_choice)
-            st.session_state.chat_history.append({"role": "assistant", "content": ai_response})
+                ai_response, from_cache = get_chat_response(user_query, st.session_state.vector_store, st.session_state.model_choice, cache_path=project_data['path'])
+            st.session_state.chat_history.append({"role": "assistant", "content": ai_response, "model": st.session_state.model_choice, "cached": from_cache})
             save_chat_history(project_data['path'], st.session_state.chat_history)
             audio_response = text_to_speech(ai_response)
             if audio_response: st.audio(audio_response, format="audio/mp3")
 
         for message in st.session_state.chat_history:
-            with st.chat_message(message["role"]): st.markdown(message["content"])
+            with st.chat_message(message["role"]):
+                st.markdown(message["content"])
+                if message.get("cached"): st.caption("♻️ Reused answer to a similar earlier question.")
 
     with tab_quiz:
         st.subheader("🎓 Test Your Knowledge")
         # UNIQUE KEY 21: btn_generate_quiz
         if st.button("🎲 Generate Quiz", key="btn_generate_quiz"):
-            if st.session_state.last_summary:
+            banked_quiz = get_quiz_from_bank(project_data['path'])
+            if banked_quiz:
+                st.session_state.last_quiz = banked_quiz
+            elif st.session_state.last_summary:
+                # Question bank is still filling in the background
                 with st.spinner("Drafting..."):
                     st.session_state.last_quiz = generate_quiz(st.session_state.last_summary, st.session_state.model_choice)
+            elif is_quiz_bank_building(project_data['path']):
+                st.info("⏳ The question bank is still being built. Try again in a moment.")
             else: st.warning("Analyze document first.")
         
         if st.session_state.last_quiz: